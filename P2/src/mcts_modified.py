@@ -1,41 +1,51 @@
 from mcts_node import MCTSNode
-from random import choice
+from random import choice, randrange
 from math import sqrt, log
+from concurrent.futures import ThreadPoolExecutor
+import gc
+import multiprocessing
+import os
+import threading
 
 num_nodes = 1000    # Number of simulations
-nodes = input("how many nodes: ")
-num_nodes = int(nodes)
+# Only prompt in the main process; worker processes import this module too
+# and must not block on stdin.
+if multiprocessing.current_process().name == 'MainProcess':
+    nodes = input("how many nodes: ")
+    num_nodes = int(nodes)
 explore_faction = sqrt(2)   # Exploration constant
+ROLLOUTS_PER_LEAF = 4   # Rollouts batched per tree pass (leaf parallelization)
+FAST_UCB = False    # Rank children by win_rate + k/visits instead of the
+                    # sqrt form below. Skips a sqrt per child but reweights
+                    # exploration, so it is off by default.
+VIRTUAL_LOSS = 1    # Transient visit/loss applied while a simulation is in flight
 
-def traverse_nodes(node, board, state, identity):
+_tree_lock = threading.Lock()   # Protects all reads/writes of the shared tree
+
+# Last completed search, so the next think() can re-root into the subtree
+# matching the opponent's reply instead of starting from scratch.
+_prev_search = {'state': None, 'action': None, 'root': None, 'identity': None}
+
+_legal_cache = {}   # state -> tuple of legal actions, cleared for every think()
+
+def _legal_actions(board, state):
     """
-    Selection phase: traverse the tree from root to leaf using UCB values.
-    
+    Memoized board.legal_actions. States are hashable tuples and the states
+    along the selection path recur on every simulation, so the legality scan
+    runs once per distinct state. Returns a tuple; callers that need to
+    mutate the result must copy it.
+
     Args:
-        node: Current node in traversal
         board: The game board
         state: Current game state
-        identity: Bot's player number
     Returns:
-        (leaf_node, leaf_state): The selected leaf node and its game state
+        Tuple of legal actions for the state
     """
-    # If reach terminal state or node with unexplored actions, stop
-    if board.is_ended(state) or len(node.untried_actions) > 0:
-        return node, state
-
-    # Find child with highest UCB value
-    best_child = None
-    best_ucb = float('-inf')
-
-    for action, child in node.child_nodes.items():
-        child_ucb = ucb(child, node, identity)
-        if child_ucb > best_ucb:
-            best_ucb = child_ucb
-            best_child = child
-
-    # Move to best child and continue traversal
-    next_state = board.next_state(state, best_child.parent_action)
-    return traverse_nodes(best_child, board, next_state, identity)
+    actions = _legal_cache.get(state)
+    if actions is None:
+        actions = tuple(board.legal_actions(state))
+        _legal_cache[state] = actions
+    return actions
 
 def expand_leaf(node, board, state):
     """
@@ -48,100 +58,97 @@ def expand_leaf(node, board, state):
     Returns:
         (new_node, new_state): The newly created node and its game state
     """
-    if board.is_ended(state) or not node.untried_actions:
+    if node.terminal or not node.untried_actions:
         return node, state
 
-    # Select random untried action
-    action = choice(node.untried_actions)
-    node.untried_actions.remove(action)
+    # Select random untried action by index; swap-pop removes it in O(1)
+    # instead of list.remove's linear scan (order is irrelevant here)
+    i = randrange(len(node.untried_actions))
+    action = node.untried_actions[i]
+    node.untried_actions[i] = node.untried_actions[-1]
+    node.untried_actions.pop()
+    if not node.untried_actions:
+        node.untried_actions = ()   # fully expanded: release the list
     
-    # Create new child node
+    # Create new child node; terminal leaves never expand, so skip
+    # computing (and storing) their move list entirely
     next_state = board.next_state(state, action)
+    terminal = board.is_ended(next_state)
     child_node = MCTSNode(
         parent=node,
         parent_action=action,
-        action_list=board.legal_actions(next_state)
+        action_list=() if terminal else _legal_actions(board, next_state)
     )
-    
+    child_node.terminal = terminal
+
     node.child_nodes[action] = child_node
+    node.children.append(child_node)
     return child_node, next_state
 
 def heuristic_rollout(board, state):
     """
     Simulation phase: play out the game from current state using heuristic moves.
-    
+
+    Both heuristic probes test candidates against the board's bitmask state
+    with the precomputed line table, so only the move actually played pays
+    for a full next_state.
+
     Args:
         board: The game board
         state: Starting state for rollout
     Returns:
         Final game state after rollout
     """
+    won = board.won
     rollout_state = state
-    
+
     while not board.is_ended(rollout_state):
-        legal_moves = board.legal_actions(rollout_state)
-        
-        # Check for winning moves
-        for move in legal_moves:
-            next_state = board.next_state(rollout_state, move)
-            if board.is_ended(next_state):
-                points = board.points_values(next_state)
-                if points[board.current_player(rollout_state)] == 1:
-                    return next_state
-        
-        # Check for blocking opponent's winning moves
-        opponent = 3 - board.current_player(rollout_state)  # Assumes players are 1 and 2
-        for move in legal_moves:
-            next_state = board.next_state(rollout_state, move)
-            if board.is_ended(next_state):
-                points = board.points_values(next_state)
-                if points[opponent] == 1:
-                    rollout_state = next_state
-                    break
-        else:
-            # If no heuristic move, play random
-            action = choice(legal_moves)
-            rollout_state = board.next_state(rollout_state, action)
-    
+        legal_moves = _legal_actions(board, rollout_state)
+        player = rollout_state[-1]
+        opponent = 3 - player  # Assumes players are 1 and 2
+        own_boards = rollout_state[17 + player]
+        opp_boards = rollout_state[17 + opponent]
+
+        move = None
+        block = None
+        for R, C, r, c in legal_moves:
+            square = 1 << (3 * r + c)
+            big = 1 << (3 * R + C)
+
+            # Winning move: completing this small board wins the big board
+            small = rollout_state[2 * (3 * R + C) + player - 1]
+            if won[small | square] and won[(own_boards | big) & ~opp_boards]:
+                move = (R, C, r, c)
+                break
+
+            # Blocking move: the opponent could win the game on this square
+            small_opp = rollout_state[2 * (3 * R + C) + opponent - 1]
+            if block is None and won[small_opp | square] and \
+                    won[(opp_boards | big) & ~own_boards]:
+                block = (R, C, r, c)
+
+        if move is None:
+            # Block if we must, otherwise play random
+            move = block if block is not None else choice(legal_moves)
+        rollout_state = board.next_state(rollout_state, move)
+
     return rollout_state
 
-def backpropagate(node, won):
+def backpropagate(node, won, count=1):
     """
     Backpropagation phase: update statistics for all nodes in path from leaf to root.
     
     Args:
         node: Starting (leaf) node
-        won: 1 for win, 0 for loss, 0.5 for draw
+        won: Score to add: 1 for win, 0 for loss, 0.5 for draw, summed over
+             count rollouts when a batch is backpropagated at once
+        count: Number of rollouts aggregated into won
     """
     while node is not None:
-        node.visits += 1
+        node.visits += count
         node.wins += won
         node = node.parent
 
-def ucb(node, parent, identity):
-    """
-    Calculate Upper Confidence Bound for trees (UCT) value for a node.
-    This balances exploitation (winning moves) with exploration (unexplored moves).
-    
-    Args:
-        node: The child node to calculate UCB for
-        parent: The parent of the child node
-        identity: The bot's player number (1 or 2)
-    Returns:
-        The UCB value for this node
-    """
-    if node.visits == 0:
-        return float('inf')  # Unvisited nodes potential set to inf
-    
-    # Calculate win rate
-    win_rate = node.wins / node.visits
-    # Invert win rate for opponent's turn
-    if parent.visits % 2 != identity - 1:
-        win_rate = 1 - win_rate
-    
-    # UCB = win_rate + exploration_term
-    return win_rate + explore_faction * sqrt(2 * log(parent.visits) / node.visits)
-
 def get_best_action(node):
     """
     Select the best action from the root node based on both visit count and win rate.
@@ -153,66 +160,228 @@ def get_best_action(node):
     """
     best_score = float('-inf')
     best_action = None
-    
+    most_visits = -1
+    fallback = None
+
+    # Single sweep tracks the score winner and the most-visited fallback
+    # together, instead of a second max() pass over the children
     for action, child in node.child_nodes.items():
-        if child.visits == 0:
+        visits = child.visits
+        if visits > most_visits:
+            most_visits = visits
+            fallback = action
+        if visits == 0:
             continue
-        
+
         # Score combines win rate , small bonus for highly visited nodes
-        score = (child.wins / child.visits) + 0.1 * sqrt(child.visits)
+        score = (child.wins / visits) + 0.1 * sqrt(visits)
         if score > best_score:
             best_score = score
             best_action = action
-    
+
     # If no good move go back to most visited node
     if best_action is None:
-        best_action = max(node.child_nodes.items(), 
-                         key=lambda x: x[1].visits)[0]
-    
+        best_action = fallback
+
     return best_action
 
-def think(board, state):
+def _simulate(board, root_node, state, identity):
     """
-    Main MCTS function: run simulations to build game tree and select best move.
-    
+    Run one MCTS simulation against the shared tree.
+
+    Selection and expansion run under the tree lock; the rollout does not
+    touch the tree, so it runs unlocked. Backpropagation then removes the
+    virtual loss from the selection path and applies the real result.
+
+    The selection descent is inlined here rather than living in its own
+    function: it runs once per ply of every pass, and skipping the call
+    frames plus binding the hot board method to a local measurably cuts
+    per-pass overhead. Each descended child picks up a virtual loss so
+    concurrent threads spread out over different branches.
+
     Args:
         board: The game board
-        state: Current game state
-    Returns:
-        The selected best action
+        root_node: Shared root of the search tree
+        state: Game state at the root
+        identity: Bot's player number
     """
-    identity_of_bot = board.current_player(state)
-    
-    # Create root node
-    root_node = MCTSNode(
-        parent=None,
-        parent_action=None,
-        action_list=board.legal_actions(state)
-    )
+    # Local bindings are cheaper than attribute/global lookups in the loop
+    board_next_state = board.next_state
+    _sqrt, _log = sqrt, log
+    neg_inf = float('-inf')
 
-    # Run MCTS simulations
-    for _ in range(num_nodes):
-        current_state = state
+    with _tree_lock:
         node = root_node
-        
-        # Find a leaf node
-        node, current_state = traverse_nodes(node, board, current_state, identity_of_bot)
-        
+        current_state = state
+
+        # Selection: descend until reaching a terminal node or a node with
+        # unexplored actions
+        while not node.terminal and not node.untried_actions:
+            # Fast pre-pass: an unvisited child always wins the UCB argmax,
+            # so take the first one without evaluating anyone's formula
+            best_child = None
+            for child in node.children:
+                if child.visits == 0:
+                    best_child = child
+                    break
+
+            if best_child is None:
+                # Full sweep: every child has visits, so no infinity
+                # shortcut. The parent terms of UCB are constant across the
+                # children, so compute them once per selection step
+                # node.visits can still be 0 here: virtual loss lands on
+                # descended children but not on this node, so in-flight
+                # threads can fully expand it before any real result has
+                # backpropagated. Clamp to 1 so log() stays in domain
+                two_log_pv = 2 * _log(node.visits or 1)
+                # Perspective of the player actually to move at this node:
+                # our turn keeps the stored win rate (sign +1, offset 0),
+                # the opponent's flips it to 1 - win_rate (sign -1, offset
+                # 1), applied branchlessly inside the child sweep
+                if current_state[-1] == identity:
+                    sign, offset = 1.0, 0.0
+                else:
+                    sign, offset = -1.0, 1.0
+
+                best_ucb = neg_inf
+                if FAST_UCB:
+                    # Surrogate ranking: fold the constants into k and score
+                    # win_rate + k/visits, trading the per-child sqrt for a
+                    # division (this reweights exploration; see flag above)
+                    k = explore_faction * explore_faction * two_log_pv
+                    for child in node.children:
+                        # Calculate win rate for the player to move
+                        win_rate = offset + sign * (child.wins / child.visits)
+                        child_ucb = win_rate + k / child.visits
+
+                        if child_ucb > best_ucb:
+                            best_ucb = child_ucb
+                            best_child = child
+                else:
+                    for child in node.children:
+                        # Calculate win rate for the player to move
+                        win_rate = offset + sign * (child.wins / child.visits)
+                        # UCB = win_rate + exploration_term
+                        child_ucb = win_rate + explore_faction * _sqrt(two_log_pv / child.visits)
+
+                        if child_ucb > best_ucb:
+                            best_ucb = child_ucb
+                            best_child = child
+
+            # Virtual loss: make this branch look worse *to the player
+            # choosing here* until the result is in. The sweep scores
+            # children as wins/visits on our turn and 1 - wins/visits on
+            # the opponent's, so the win adjustment must flip with it
+            best_child.visits += VIRTUAL_LOSS
+            if current_state[-1] == identity:
+                best_child.wins -= VIRTUAL_LOSS
+            else:
+                best_child.wins += VIRTUAL_LOSS
+
+            # Move to best child and continue traversal
+            current_state = board_next_state(current_state, best_child.parent_action)
+            node = best_child
+
+        leaf = node
+        leaf_player = current_state[-1]
+
         # Add a new node if not terminal
-        if not board.is_ended(current_state):
+        if not node.terminal:
             node, current_state = expand_leaf(node, board, current_state)
-        
-        # Play out the game
+
+    # Play out a batch of games from the leaf; the rollouts are
+    # independent of the tree, so their scores sum into one update
+    score = 0
+    for _ in range(ROLLOUTS_PER_LEAF):
         final_state = heuristic_rollout(board, current_state)
-        
-        # Update node stats
         points = board.points_values(final_state)
-        if points[identity_of_bot] == 1:
-            backpropagate(node, 1)  # Win
-        elif points[identity_of_bot] == -1:
-            backpropagate(node, 0)  # Loss
-        else:
-            backpropagate(node, 0.5)  # Draw
-
-    # Select and return best action
-    return get_best_action(root_node)
+        if points[identity] == 1:
+            score += 1      # Win
+        elif points[identity] == 0:
+            score += 0.5    # Draw
+
+    with _tree_lock:
+        # Undo the virtual loss on the selection path (root excluded),
+        # then apply the real result. Each node's loss was signed by the
+        # player choosing at its parent; players strictly alternate, so
+        # walk that sign back up starting from the leaf state's player
+        undo = leaf
+        undo_player = leaf_player
+        while undo.parent is not None:
+            undo_player = 3 - undo_player
+            undo.visits -= VIRTUAL_LOSS
+            if undo_player == identity:
+                undo.wins += VIRTUAL_LOSS
+            else:
+                undo.wins -= VIRTUAL_LOSS
+            undo = undo.parent
+        backpropagate(node, score, ROLLOUTS_PER_LEAF)
+
+def think(board, state):
+    """
+    Main MCTS function: run simulations from a pool of worker threads against
+    one shared tree and select the best move.
+
+    Args:
+        board: The game board
+        state: Current game state
+    Returns:
+        The selected best action
+    """
+    identity_of_bot = board.current_player(state)
+    _legal_cache.clear()    # bound memory: stale states never recur anyway
+
+    # Tree reuse: if the game advanced by our cached move plus one opponent
+    # reply, the matching grandchild of the old root already carries all of
+    # that subtree's statistics, so re-root there and keep them. Only valid
+    # when the cached tree was built for the same player, since win rates
+    # are stored from the searching bot's perspective.
+    root_node = None
+    prev_root = _prev_search['root']
+    if prev_root is not None and _prev_search['identity'] == identity_of_bot:
+        our_child = prev_root.child_nodes.get(_prev_search['action'])
+        if our_child is not None:
+            after_our_move = board.next_state(_prev_search['state'],
+                                              _prev_search['action'])
+            for action, grandchild in our_child.child_nodes.items():
+                if board.next_state(after_our_move, action) == state:
+                    root_node = grandchild
+                    root_node.parent = None     # detach so the old tree can be freed
+                    break
+
+    if root_node is None:
+        # No reusable subtree: create a fresh shared root node
+        root_node = MCTSNode(
+            parent=None,
+            parent_action=None,
+            action_list=_legal_actions(board, state)
+        )
+        root_node.terminal = board.is_ended(state)
+
+    # The search allocates thousands of nodes and states but creates no
+    # garbage cycles mid-run, so pause the generational GC for its duration
+    # instead of paying for collections triggered by the allocation counter.
+    # (Core pinning stays out of this file: the threads share one process.)
+    gc.disable()
+    try:
+        # All threads search the same tree; virtual loss keeps them apart
+        threads = os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            # Each task backpropagates a whole rollout batch, so fewer tasks
+            # cover the same playout budget
+            futures = [executor.submit(_simulate, board, root_node, state,
+                                       identity_of_bot)
+                       for _ in range(max(1, num_nodes // ROLLOUTS_PER_LEAF))]
+            for future in futures:
+                future.result()
+    finally:
+        gc.enable()
+        gc.collect()
+
+    # Select the best action and remember this search for the next call
+    best_action = get_best_action(root_node)
+    _prev_search['state'] = state
+    _prev_search['action'] = best_action
+    _prev_search['root'] = root_node
+    _prev_search['identity'] = identity_of_bot
+    return best_action
@@ -1,7 +1,12 @@
 
 
 class MCTSNode:
-    def __init__(self, parent=None, parent_action=None, action_list=[]):
+    # Slots give C-level attribute storage: faster reads in the selection
+    # loop and no per-instance __dict__ for the thousands of nodes per move.
+    __slots__ = ('parent', 'parent_action', 'child_nodes', 'children',
+                 'untried_actions', 'wins', 'visits', 'terminal')
+
+    def __init__(self, parent=None, parent_action=None, action_list=()):
         """ Initializes the tree node for MCTS. The node stores links to other nodes in the tree (parent and child
         nodes), as well as keeps track of the number of wins and total simulations that have visited the node.
 
@@ -15,11 +20,14 @@ class MCTSNode:
         self.parent_action = parent_action      # The move that got us to this node - "None" for the root node.
 
         self.child_nodes = {}                   # Action -> MCTSNode dictionary of children
-        self.untried_actions = action_list      # Yet unexplored actions
+        self.children = []                      # Same children as a flat list for fast sweeps
+        self.untried_actions = list(action_list)    # Yet unexplored actions (own copy)
 
         self.wins = 0                           # Total wins of all paths through this node.
         self.visits = 0                         # Number of times this node has been visited.
 
+        self.terminal = False                   # Whether this node's state ends the game.
+
     def __repr__(self):
         """
         This method provides a string representing the node. Any time str(node) is used, this method is called.
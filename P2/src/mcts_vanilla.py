@@ -1,41 +1,42 @@
 from mcts_node import MCTSNode
-from random import choice
+from random import choice, randrange, seed
 from math import sqrt, log
+import gc
+import multiprocessing
+import os
 
 num_nodes = 1000    # at 1000 for testing against rollout
-nodes = input("how many nodes: ")
-num_nodes = int(nodes)
+# Only prompt in the main process; worker processes import this module too
+# and must not block on stdin.
+if multiprocessing.current_process().name == 'MainProcess':
+    nodes = input("how many nodes: ")
+    num_nodes = int(nodes)
 explore_faction = sqrt(2)   # changed from 2
+ROLLOUTS_PER_LEAF = 4   # Rollouts batched per tree pass (leaf parallelization)
+FAST_UCB = False    # Rank children by win_rate + k/visits instead of the
+                    # sqrt form below. Skips a sqrt per child but reweights
+                    # exploration, so it is off by default.
 
-def traverse_nodes(node, board, state, identity):
+_legal_cache = {}   # state -> tuple of legal actions, cleared for every think()
+
+def _legal_actions(board, state):
     """
-    Selection phase: traverse the tree from root to leaf using UCB values.
-    
+    Memoized board.legal_actions. States are hashable tuples and the states
+    along the selection path recur on every simulation, so the legality scan
+    runs once per distinct state. Returns a tuple; callers that need to
+    mutate the result must copy it.
+
     Args:
-        node: Current node in traversal
         board: The game board
         state: Current game state
-        identity: Bot's player number
     Returns:
-        (leaf_node, leaf_state): The selected leaf node and its game state
+        Tuple of legal actions for the state
     """
-    # If reach terminal state or node with unexplored actions, stop
-    if board.is_ended(state) or len(node.untried_actions) > 0:
-        return node, state
-
-    # Find child with highest UCB value
-    best_child = None
-    best_ucb = float('-inf')
-
-    for action, child in node.child_nodes.items():
-        child_ucb = ucb(child, node, identity)
-        if child_ucb > best_ucb:
-            best_ucb = child_ucb
-            best_child = child
-
-    # Move to best child and continue traversal
-    next_state = board.next_state(state, best_child.parent_action)
-    return traverse_nodes(best_child, board, next_state, identity)
+    actions = _legal_cache.get(state)
+    if actions is None:
+        actions = tuple(board.legal_actions(state))
+        _legal_cache[state] = actions
+    return actions
 
 def expand_leaf(node, board, state):
     """
@@ -48,91 +49,90 @@ def expand_leaf(node, board, state):
     Returns:
         (new_node, new_state): The newly created node and its game state
     """
-    if board.is_ended(state) or not node.untried_actions:
+    if node.terminal or not node.untried_actions:
         return node, state
 
-    # Select random untried action
-    action = choice(node.untried_actions)
-    node.untried_actions.remove(action)
+    # Select random untried action by index; swap-pop removes it in O(1)
+    # instead of list.remove's linear scan (order is irrelevant here)
+    i = randrange(len(node.untried_actions))
+    action = node.untried_actions[i]
+    node.untried_actions[i] = node.untried_actions[-1]
+    node.untried_actions.pop()
+    if not node.untried_actions:
+        node.untried_actions = ()   # fully expanded: release the list
     
-    # Create new child node
+    # Create new child node; terminal leaves never expand, so skip
+    # computing (and storing) their move list entirely
     next_state = board.next_state(state, action)
+    terminal = board.is_ended(next_state)
     child_node = MCTSNode(
         parent=node,
         parent_action=action,
-        action_list=board.legal_actions(next_state)
+        action_list=() if terminal else _legal_actions(board, next_state)
     )
-    
+    child_node.terminal = terminal
+
     node.child_nodes[action] = child_node
+    node.children.append(child_node)
     return child_node, next_state
 
 def rollout(board, state):
     """
     Simulation phase: play out the game from current state using random moves,
     but with basic winning move detection.
-    
+
+    The winning-move probe tests each candidate against the board's bitmask
+    state with the precomputed line table, so only the move actually played
+    pays for a full next_state.
+
     Args:
         board: The game board
         state: Starting state for rollout
     Returns:
         Final game state after rollout
     """
+    won = board.won
     rollout_state = state
-    
+
     while not board.is_ended(rollout_state):
-        legal_moves = board.legal_actions(rollout_state)
-        
-        # Check for winning moves
-        for move in legal_moves:
-            next_state = board.next_state(rollout_state, move)
-            if board.is_ended(next_state):
-                points = board.points_values(next_state)
-                if points[board.current_player(rollout_state)] == 1:
-                    return next_state
-        
+        legal_moves = _legal_actions(board, rollout_state)
+        player = rollout_state[-1]
+        own_boards = rollout_state[17 + player]
+        other_boards = rollout_state[20 - player]
+
+        # Check for winning moves: completing a line in the small board
+        # must also complete a line of boards owned only by us
+        move = None
+        for R, C, r, c in legal_moves:
+            small = rollout_state[2 * (3 * R + C) + player - 1]
+            if won[small | (1 << (3 * r + c))]:
+                big = own_boards | (1 << (3 * R + C))
+                if won[big & ~other_boards]:
+                    move = (R, C, r, c)
+                    break
+
         # If no winning move, play random
-        action = choice(legal_moves)
-        rollout_state = board.next_state(rollout_state, action)
-    
+        if move is None:
+            move = choice(legal_moves)
+        rollout_state = board.next_state(rollout_state, move)
+
     return rollout_state
 
-def backpropagate(node, won):
+def backpropagate(node, won, count=1):
     """
     Backpropagation phase: update statistics for all nodes in path from leaf to root.
     
     Args:
         node: Starting (leaf) node
-        won: 1 for win, 0 for loss, 0.5 for draw
+        won: Score to add: 1 for win, 0 for loss, 0.5 for draw, summed over
+             count rollouts when a batch is backpropagated at once
+        count: Number of rollouts aggregated into won
     """
     while node is not None:
-        node.visits += 1
+        node.visits += count
         node.wins += won
         node = node.parent
 
-def ucb(node, parent, identity):
-    """
-    Calculate Upper Confidence Bound for trees (UCT) value for a node.
-    This balances exploitation (winning moves) with exploration (unexplored moves).
-    
-    Args:
-        node: The child node to calculate UCB for
-        parent: The parent of the child node
-        identity: The bot's player number (1 or 2)
-    Returns:
-        The UCB value for this node
-    """
-    if node.visits == 0:
-        return float('inf')  # unvisited nodes potential set to inf
-    
-    # Calculate win rate
-    win_rate = node.wins / node.visits
-    # If its opponents turn, invert win rate 
-    if parent.visits % 2 != identity - 1:
-        win_rate = 1 - win_rate
-    
-    # UCB = win_rate + exploration_term
-    return win_rate + explore_faction * sqrt(2 * log(parent.visits) / node.visits)
-
 def is_win(board, state, identity):
     """
     Check if the given player has won the game.
@@ -160,66 +160,212 @@ def get_best_action(node):
     """
     best_score = float('-inf')
     best_action = None
-    
+    most_visits = -1
+    fallback = None
+
+    # Single sweep tracks the score winner and the most-visited fallback
+    # together, instead of a second max() pass over the children
     for action, child in node.child_nodes.items():
-        if child.visits == 0:
+        visits = child.visits
+        if visits > most_visits:
+            most_visits = visits
+            fallback = action
+        if visits == 0:
             continue
-        
+
         # Score combines win rate , small bonus for highly visited nodes
-        score = (child.wins / child.visits) + 0.1 * sqrt(child.visits)
+        score = (child.wins / visits) + 0.1 * sqrt(visits)
         if score > best_score:
             best_score = score
             best_action = action
-    
+
     # If no good move go back to most visited node
     if best_action is None:
-        best_action = max(node.child_nodes.items(), 
-                         key=lambda x: x[1].visits)[0]
-    
+        best_action = fallback
+
     return best_action
 
-def think(board, state):
+def build_tree(board, state, identity, n):
     """
-    Main MCTS function: run simulations to build game tree and select best move.
-    
+    Run n MCTS simulations from the given state and return the finished root node.
+
+    The selection descent is inlined here rather than living in its own
+    function: it runs once per ply of every pass, and skipping the call
+    frames plus binding the hot board methods to locals measurably cuts
+    per-pass overhead.
+
     Args:
         board: The game board
         state: Current game state
+        identity: Bot's player number
+        n: Number of simulations to run
     Returns:
-        The selected best action
+        The root node of the completed search tree
     """
-    identity_of_bot = board.current_player(state)
-    
     # Create root node
     root_node = MCTSNode(
         parent=None,
         parent_action=None,
-        action_list=board.legal_actions(state)
+        action_list=_legal_actions(board, state)
     )
+    root_node.terminal = board.is_ended(state)
+
+    # Local bindings are cheaper than attribute/global lookups in the loop
+    board_next_state = board.next_state
+    board_points_values = board.points_values
+    _sqrt, _log = sqrt, log
+    neg_inf = float('-inf')
 
-    # Run MCTS simulations
-    for _ in range(num_nodes):
+    # Run MCTS tree passes; each one backpropagates a whole rollout batch,
+    # so fewer passes cover the same playout budget
+    for _ in range(max(1, n // ROLLOUTS_PER_LEAF)):
         current_state = state
         node = root_node
-        
-        #  Find a leaf node
-        node, current_state = traverse_nodes(node, board, current_state, identity_of_bot)
-        
+
+        # Selection: descend until reaching a terminal node or a node with
+        # unexplored actions
+        while not node.terminal and not node.untried_actions:
+            # Fast pre-pass: an unvisited child always wins the UCB argmax,
+            # so take the first one without evaluating anyone's formula
+            best_child = None
+            for child in node.children:
+                if child.visits == 0:
+                    best_child = child
+                    break
+
+            if best_child is None:
+                # Full sweep: every child has visits, so no infinity
+                # shortcut. The parent terms of UCB are constant across the
+                # children, so compute them once per selection step
+                two_log_pv = 2 * _log(node.visits)
+                # Perspective of the player actually to move at this node:
+                # our turn keeps the stored win rate (sign +1, offset 0),
+                # the opponent's flips it to 1 - win_rate (sign -1, offset
+                # 1), applied branchlessly inside the child sweep
+                if current_state[-1] == identity:
+                    sign, offset = 1.0, 0.0
+                else:
+                    sign, offset = -1.0, 1.0
+
+                best_ucb = neg_inf
+                if FAST_UCB:
+                    # Surrogate ranking: fold the constants into k and score
+                    # win_rate + k/visits, trading the per-child sqrt for a
+                    # division (this reweights exploration; see flag above)
+                    k = explore_faction * explore_faction * two_log_pv
+                    for child in node.children:
+                        # Calculate win rate for the player to move
+                        win_rate = offset + sign * (child.wins / child.visits)
+                        child_ucb = win_rate + k / child.visits
+
+                        if child_ucb > best_ucb:
+                            best_ucb = child_ucb
+                            best_child = child
+                else:
+                    for child in node.children:
+                        # Calculate win rate for the player to move
+                        win_rate = offset + sign * (child.wins / child.visits)
+                        # UCB = win_rate + exploration_term
+                        child_ucb = win_rate + explore_faction * _sqrt(two_log_pv / child.visits)
+
+                        if child_ucb > best_ucb:
+                            best_ucb = child_ucb
+                            best_child = child
+
+            # Move to best child and continue traversal
+            current_state = board_next_state(current_state, best_child.parent_action)
+            node = best_child
+
         # Add a new node if not terminal
-        if not board.is_ended(current_state):
+        if not node.terminal:
             node, current_state = expand_leaf(node, board, current_state)
-        
-        # Play out the game
-        final_state = rollout(board, current_state)
-        
+
+        # Play out a batch of games from the leaf; the rollouts are
+        # independent of the tree, so their scores sum into one update
+        score = 0
+        for _ in range(ROLLOUTS_PER_LEAF):
+            final_state = rollout(board, current_state)
+            points = board_points_values(final_state)
+            if points[identity] == 1:
+                score += 1      # Win
+            elif points[identity] == 0:
+                score += 0.5    # Draw
+
         # Update node stats
-        points = board.points_values(final_state)
-        if points[identity_of_bot] == 1:
-            backpropagate(node, 1)  # Win
-        elif points[identity_of_bot] == -1:
-            backpropagate(node, 0)  # Loss
-        else:
-            backpropagate(node, 0.5)  # Draw
+        backpropagate(node, score, ROLLOUTS_PER_LEAF)
+
+    return root_node
+
+def _worker(worker_id, worker_seed, board, state, n):
+    """
+    Root-parallel worker: build one independent tree with its own random seed.
+
+    Args:
+        worker_id: Index of this worker, used to pin it to a core
+        worker_seed: Seed for this worker's random number generator
+        board: The game board
+        state: Current game state
+        n: Number of simulations for this worker
+    Returns:
+        Dictionary mapping each root action to its (visits, wins) totals
+    """
+    if hasattr(os, 'sched_setaffinity'):
+        # Pin each worker to its own core so its tree stays cache-warm
+        # instead of migrating between CPUs mid-search
+        try:
+            os.sched_setaffinity(0, {worker_id % (os.cpu_count() or 1)})
+        except OSError:
+            pass    # restricted environments may forbid setting affinity
+
+    seed(worker_seed)
+    _legal_cache.clear()    # bound memory: stale states never recur anyway
+    identity = board.current_player(state)
+
+    # The search allocates thousands of nodes and states but creates no
+    # garbage cycles mid-run, so pause the generational GC for its duration
+    # instead of paying for collections triggered by the allocation counter
+    gc.disable()
+    try:
+        root_node = build_tree(board, state, identity, n)
+    finally:
+        gc.enable()
+        gc.collect()
+
+    return {action: (child.visits, child.wins)
+            for action, child in root_node.child_nodes.items()}
+
+def think(board, state):
+    """
+    Main MCTS function: build independent trees in parallel worker processes,
+    merge their root statistics, and select the best move.
+
+    Args:
+        board: The game board
+        state: Current game state
+    Returns:
+        The selected best action
+    """
+    workers = os.cpu_count() or 1
+    per_worker = max(1, num_nodes // workers)
+    seeds = [randrange(2 ** 32) for _ in range(workers)]
+
+    # Each worker builds its own tree; no shared state, so no locking needed
+    with multiprocessing.Pool(workers) as pool:
+        results = pool.starmap(_worker,
+                               [(i, s, board, state, per_worker)
+                                for i, s in enumerate(seeds)])
+
+    # Merge per-action visit/win counts from every tree at the root
+    merged_root = MCTSNode(parent=None, parent_action=None, action_list=[])
+    for result in results:
+        for action, (visits, wins) in result.items():
+            child = merged_root.child_nodes.get(action)
+            if child is None:
+                child = MCTSNode(parent=merged_root, parent_action=action,
+                                 action_list=[])
+                merged_root.child_nodes[action] = child
+            child.visits += visits
+            child.wins += wins
 
     # Select and return best action
-    return get_best_action(root_node)
+    return get_best_action(merged_root)
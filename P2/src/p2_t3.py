@@ -195,7 +195,7 @@ class Board(object):
         updated_board = state[board_index + player_index]
 
         full = (state[board_index] | state[board_index + 1] == 0x1ff)
-        if any(updated_board & w == w for w in self.wins):
+        if self.won[updated_board]:
             state[18 + player_index] |= positions[(R, C)]
         elif full:
             state[18] |= positions[(R, C)]
@@ -271,9 +271,7 @@ class Board(object):
         p1 = state[18] & ~state[19]
         p2 = state[19] & ~state[18]
 
-        if any(w & p1 == w for w in self.wins):
-            return True
-        if any(w & p2 == w for w in self.wins):
+        if self.won[p1] or self.won[p2]:
             return True
         if state[18] | state[19] == 0x1ff:
             return True
@@ -286,9 +284,9 @@ class Board(object):
         p1 = state[18] & ~state[19]
         p2 = state[19] & ~state[18]
 
-        if any(w & p1 == w for w in self.wins):
+        if self.won[p1]:
             return {1: 1, 2: 0}
-        if any(w & p2 == w for w in self.wins):
+        if self.won[p2]:
             return {1: 0, 2: 1}
         if state[18] | state[19] == 0x1ff:
             return {1: 0.5, 2: 0.5}
@@ -313,9 +311,9 @@ class Board(object):
         p1 = state[18] & ~state[19]
         p2 = state[19] & ~state[18]
 
-        if any(w & p1 == w for w in self.wins):
+        if self.won[p1]:
             return {1: 1, 2: -1}
-        if any(w & p2 == w for w in self.wins):
+        if self.won[p2]:
             return {1: -1, 2: 1}
         if state[18] | state[19] == 0x1ff:
             return {1: 0, 2: 0}
@@ -326,3 +324,11 @@ class Board(object):
         if value == 0.5:
             return "Draw."
         return "Winner: Player {0}.".format(winner)
+
+# For each of the 512 possible 3x3 occupancy masks, whether it contains a
+# completed line. Lets callers test "would this placement win?" with a
+# single table lookup instead of scanning the win masks.
+Board.won = tuple(
+    any(w & mask == w for w in Board.wins)
+    for mask in range(512)
+)